@@ -1,95 +1,421 @@
-from flask import Flask, request, jsonify
+from flask import Flask, g, request
 from flask_cors import CORS
+import msgpack
 import numpy as np
+import orjson
 import pandas as pd
+import redis
+from numba import njit
 from sklearn.ensemble import IsolationForest
-from sklearn.preprocessing import StandardScaler
+import bisect
+import hashlib
+import itertools
 import joblib
+import math
 import os
+import threading
+import time
+import uuid
 from datetime import datetime
 import json
 
 app = Flask(__name__)
 CORS(app)
 
-# Global variables for ML models
-models = {}
-scalers = {}
+# Profiles are stored in Redis when REDIS_URL is set so every worker shares
+# them; otherwise they live in this process's user_profiles dict
 user_profiles = {}
+REDIS_URL = os.environ.get('REDIS_URL')
+redis_client = redis.Redis.from_url(REDIS_URL) if REDIS_URL else None
+PROFILE_KEY = 'prof:{}'
+PROFILE_INDEX_KEY = 'profiles'  # Set of user ids with a stored profile
+PROFILES_VERSION_KEY = 'profiles:version'  # Bumped on every profile write or delete
+PROFILE_LOCK_KEY = 'prof-lock:{}'
+PROFILE_LOCK_TIMEOUT = 5  # Seconds
+PROFILE_PAGE_SIZE = 500  # Profiles fetched per SSCAN/MGET round trip
+GLOBAL_POOL_KEY = 'global-detector:pool'  # float32 baseline samples, one row per signal
+GLOBAL_DETECTOR_VERSION_KEY = 'global-detector:version'
+GLOBAL_REFIT_LOCK_KEY = 'global-detector:refit-lock'
+
+# Striped locks for the in-process store, so concurrent requests for the
+# same user update its profile one at a time
+profile_locks = [threading.Lock() for _ in range(64)]
+
+# Version of the in-process store; the boot id stops ETags issued by an
+# earlier process from matching after a restart
+PROCESS_BOOT_ID = uuid.uuid4().hex
+profiles_version = 0
+profiles_version_lock = threading.Lock()
+
+@app.before_request
+def capture_request_time():
+    """Read the clock once per request for every timestamp it records"""
+    g.now_iso = datetime.now().isoformat()
+
+def json_response(obj, status=200):
+    """Serialize a response body with orjson, which also handles NumPy values"""
+    return app.response_class(
+        orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY),
+        status=status,
+        mimetype='application/json'
+    )
+
+def conditional_response(version, build_body):
+    """JSON response tagged with an ETag for version, or 304 if the client already has it"""
+    etag = hashlib.blake2s(version.encode()).hexdigest()[:16]
+    if request.if_none_match.contains(etag):
+        response = app.response_class(status=304)
+    else:
+        response = json_response(build_body())
+    response.set_etag(etag)
+    return response
+
+# Behavior signals tracked per user, in feature column order
+SIGNALS = ('typing_intervals', 'mouse_movements', 'scroll_events')
+BASELINE_SIZE = 100  # Most recent samples kept per signal
+MIN_BASELINE_SAMPLES = 10  # Samples a user needs before scoring against their own baseline
+SIGNAL_LABELS = ('Typing', 'Mouse activity', 'Scroll pattern')
+BEHAVIOR_METRICS = (  # Request field and default for each signal
+    ('avgTypingInterval', 250),
+    ('mouseMovementCount', 0),
+    ('scrollEventCount', 0)
+)
+MAX_METRIC_VALUE = 1e9  # Far above any real metric, low enough that M2 cannot overflow
+RECOMMENDATIONS = ('pass', 'reauthenticate', 'lock')
+RECOMMENDATION_THRESHOLDS = (30, 70)  # Overall score cut-offs between recommendations
+GLOBAL_REFIT_INTERVAL = int(os.environ.get('GLOBAL_REFIT_INTERVAL', 300))  # Seconds
+GLOBAL_SYNC_INTERVAL = int(os.environ.get('GLOBAL_SYNC_INTERVAL', 30))  # Seconds between checks for a shared pool
+GLOBAL_POOL_SIZE = 10000  # Most baseline samples the population detector fits on
 
 class AnomalyDetector:
+    """Population-wide isolation forests, one per behavior signal"""
     def __init__(self):
-        self.model = IsolationForest(
-            contamination=0.1,  # Expected proportion of anomalies
-            random_state=42,
-            n_estimators=100
-        )
-        self.scaler = StandardScaler()
-        self.is_trained = False
+        self.fitted = None  # Signal -> (model, min and max training score, min and max value)
+        self.version = None  # Version of the shared pool it was fit on
         
-    def train(self, data):
-        """Train the anomaly detection model"""
-        if len(data) < 10:
-            return False  # Need at least 10 samples
-            
-        # Convert to numpy array and reshape
-        X = np.array(data).reshape(-1, 1)
+    @property
+    def is_trained(self):
+        return self.fitted is not None
         
-        # Scale the data
-        X_scaled = self.scaler.fit_transform(X)
+    def train(self, pooled_data):
+        """Train the anomaly detection models on baselines pooled across users"""
+        if len(pooled_data[SIGNALS[0]]) < MIN_BASELINE_SAMPLES:
+            return False
+            
+        # Fit the signals concurrently; tree building mostly runs outside the GIL
+        results = joblib.Parallel(n_jobs=len(SIGNALS), backend='threading')(
+            joblib.delayed(self.fit_signal)(pooled_data[signal]) for signal in SIGNALS
+        )
         
-        # Train the model
-        self.model.fit(X_scaled)
-        self.is_trained = True
+        # Swap in the new models at once so concurrent requests never mix fits
+        self.fitted = dict(zip(SIGNALS, results))
         return True
         
-    def predict(self, data):
-        """Predict anomaly score for new data"""
-        if not self.is_trained:
-            return 0.5  # Default score if not trained
-            
-        X = np.array(data).reshape(-1, 1)
-        X_scaled = self.scaler.transform(X)
+    @staticmethod
+    def fit_signal(values):
+        """Fit one signal's model, returning it with its training score and value ranges"""
+        # IsolationForest works in float32, so convert once up front. Trees
+        # split on thresholds, so the raw values need no scaling
+        X = np.asarray(values, dtype=np.float32).reshape(-1, 1)
+        model = IsolationForest(
+            # Expected proportion of anomalies; pooled baselines are mostly
+            # ordinary behavior, and offset_ sits at this training-score quantile
+            contamination=0.01,
+            random_state=42,
+            # Path lengths on 1-D data converge well within 25 trees of 64 samples
+            n_estimators=25,
+            max_samples=min(64, len(X))
+            # n_jobs stays sequential: train already fits the signals in
+            # parallel, and a thread pool costs more than 25 tiny trees
+        )
+        model.fit(X)
+        train_scores = model.score_samples(X)
+        return model, float(train_scores.min()), float(train_scores.max()), float(X.min()), float(X.max())
         
-        # Get anomaly scores (lower = more anomalous)
-        scores = self.model.score_samples(X_scaled)
+    def predict(self, sample):
+        """Predict anomaly scores for every signal of a single sample"""
+        fitted = self.fitted
+        X = np.asarray(sample, dtype=np.float32).reshape(-1, 1)
+        scores = []
+        for i, signal in enumerate(SIGNALS):
+            model, train_scores_min, train_scores_max, value_min, value_max = fitted[signal]
+            
+            # Get anomaly score (lower = more anomalous). X is already a 2-D
+            # float32 matrix, so skip the input checks score_samples repeats
+            score = -float(model._compute_chunked_score_samples(X[i:i + 1])[0])
+            
+            # Convert to 0-100 scale against the pooled training scores, with the
+            # forest's decision boundary (offset_) at the first recommendation
+            # threshold so ordinary newcomers stay below it
+            threshold = RECOMMENDATION_THRESHOLDS[0]
+            if score >= model.offset_:
+                normalized_score = threshold * (train_scores_max - score) / (train_scores_max - model.offset_ + 1e-8)
+            else:
+                normalized_score = threshold + (100 - threshold) * (model.offset_ - score) / (model.offset_ - train_scores_min + 1e-8)
+                
+            # Trees only split inside the training range, so a value beyond it
+            # scores like the edge sample; add how far past the edge it is
+            overshoot = max(value_min - float(X[i, 0]), float(X[i, 0]) - value_max, 0.0)
+            normalized_score += (100 - threshold) * overshoot / (value_max - value_min + 1e-8)
+            scores.append(min(max(normalized_score, 0.0), 100.0))
+        return scores
+
+global_detector = AnomalyDetector()
+
+@njit(cache=True)
+def score_request(sample, detector_stats):
+    """Z-score a sample against each signal's running (n, mean, M2), then fold it in"""
+    scores = np.empty(len(sample))
+    for i in range(len(sample)):
+        x = sample[i]
+        n = detector_stats[i, 0]
+        mean = detector_stats[i, 1]
+        M2 = detector_stats[i, 2]  # Sum of squared deviations from the mean
         
-        # Convert to 0-100 scale where higher = more anomalous
-        normalized_scores = 100 * (1 - (scores - scores.min()) / (scores.max() - scores.min() + 1e-8))
-        return float(normalized_scores[0])
+        # Anomaly score on a 0-100 scale where higher = more anomalous
+        if n < MIN_BASELINE_SAMPLES:
+            scores[i] = 0.5  # Default score until there is a baseline
+        else:
+            std = math.sqrt(M2 / (n - 1) + 1e-8)
+            scores[i] = min(100.0, 50 * abs((x - mean) / std))
+            
+        # Welford update of the running mean and variance
+        n += 1
+        delta = x - mean
+        mean += delta / n
+        detector_stats[i, 0] = n
+        detector_stats[i, 1] = mean
+        detector_stats[i, 2] = M2 + delta * (x - mean)
+    return scores
 
 def create_user_profile(user_id):
     """Create a new user profile with default behavior patterns"""
     profile = {
         'user_id': user_id,
-        'typing_detector': AnomalyDetector(),
-        'mouse_detector': AnomalyDetector(),
-        'scroll_detector': AnomalyDetector(),
-        'baseline_data': {
-            'typing_intervals': [],
-            'mouse_movements': [],
-            'scroll_events': []
-        },
-        'created_at': datetime.now().isoformat(),
-        'last_updated': datetime.now().isoformat()
+        'detector_stats': np.zeros((len(SIGNALS), 3)),  # Running (n, mean, M2) per signal
+        # Ring buffer of recent samples, one row per signal
+        'baseline_data': np.zeros((len(SIGNALS), BASELINE_SIZE)),
+        'baseline_count': 0,  # Samples written to the ring buffer so far
+        'stats_cache': None,  # Baseline stats, reset whenever samples change
+        'created_at': g.now_iso,
+        'last_updated': g.now_iso
     }
-    user_profiles[user_id] = profile
     return profile
 
+def serialize_profile(profile):
+    """Pack a profile's baseline data and detector state for Redis"""
+    return msgpack.packb({
+        'user_id': profile['user_id'],
+        'detector_stats': profile['detector_stats'].tobytes(),
+        'baseline_data': profile['baseline_data'].tobytes(),
+        'baseline_count': profile['baseline_count'],
+        # Computed on the write path so /profile reads in any worker can reuse it
+        'stats_cache': get_baseline_stats(profile),
+        'created_at': profile['created_at'],
+        'last_updated': profile['last_updated']
+    })
+
+def deserialize_profile(raw):
+    """Rebuild a profile packed by serialize_profile"""
+    record = msgpack.unpackb(raw)
+    return {
+        'user_id': record['user_id'],
+        'detector_stats': np.frombuffer(record['detector_stats'], dtype=np.float64).reshape(len(SIGNALS), 3).copy(),
+        'baseline_data': np.frombuffer(record['baseline_data'], dtype=np.float64).reshape(len(SIGNALS), BASELINE_SIZE).copy(),
+        'baseline_count': record['baseline_count'],
+        'stats_cache': record.get('stats_cache'),
+        'created_at': record['created_at'],
+        'last_updated': record['last_updated']
+    }
+
+def profile_lock(user_id):
+    """Lock to hold while a user's profile is read, updated and written back"""
+    if redis_client is None:
+        return profile_locks[hash(user_id) % len(profile_locks)]
+    return redis_client.lock(
+        PROFILE_LOCK_KEY.format(user_id),
+        timeout=PROFILE_LOCK_TIMEOUT,
+        blocking_timeout=PROFILE_LOCK_TIMEOUT
+    )
+
+def load_profile(user_id):
+    """Load a stored profile, or None if the user has none"""
+    if redis_client is None:
+        return user_profiles.get(user_id)
+    raw = redis_client.get(PROFILE_KEY.format(user_id))
+    return deserialize_profile(raw) if raw is not None else None
+
+def save_profile(profile):
+    """Store a new or updated profile"""
+    if redis_client is None:
+        user_profiles[profile['user_id']] = profile
+        bump_profiles_version()
+        return
+    pipe = redis_client.pipeline()
+    pipe.set(PROFILE_KEY.format(profile['user_id']), serialize_profile(profile))
+    pipe.sadd(PROFILE_INDEX_KEY, profile['user_id'])
+    pipe.incr(PROFILES_VERSION_KEY)
+    pipe.execute()
+
+def remove_profile(user_id):
+    """Remove a stored profile, returning whether it existed"""
+    if redis_client is None:
+        if user_profiles.pop(user_id, None) is None:
+            return False
+        bump_profiles_version()
+        return True
+    pipe = redis_client.pipeline()
+    pipe.delete(PROFILE_KEY.format(user_id))
+    pipe.srem(PROFILE_INDEX_KEY, user_id)
+    pipe.incr(PROFILES_VERSION_KEY)
+    deleted, _, _ = pipe.execute()
+    return deleted > 0
+
+def bump_profiles_version():
+    """Mark the in-process store as changed"""
+    global profiles_version
+    with profiles_version_lock:
+        profiles_version += 1
+
+def get_profiles_version():
+    """Version string that changes whenever any profile is saved or removed"""
+    if redis_client is None:
+        return f"{PROCESS_BOOT_ID}:{profiles_version}"
+    return (redis_client.get(PROFILES_VERSION_KEY) or b'0').decode()
+
+def iter_profiles():
+    """All stored profiles, fetched from Redis a page at a time"""
+    if redis_client is None:
+        yield from list(user_profiles.values())
+        return
+    user_ids = redis_client.sscan_iter(PROFILE_INDEX_KEY, count=PROFILE_PAGE_SIZE)
+    while True:
+        page = list(itertools.islice(user_ids, PROFILE_PAGE_SIZE))
+        if not page:
+            return
+        for raw in redis_client.mget([PROFILE_KEY.format(user_id.decode()) for user_id in page]):
+            if raw is not None:
+                yield deserialize_profile(raw)
+
+def count_profiles():
+    """Number of stored profiles"""
+    if redis_client is None:
+        return len(user_profiles)
+    return redis_client.scard(PROFILE_INDEX_KEY)
+
+def baseline_length(profile):
+    """Number of samples currently held in a profile's baseline"""
+    return min(profile['baseline_count'], BASELINE_SIZE)
+
+def baseline_window(profile):
+    """View of a profile's baseline samples, one row per signal, in ring buffer order"""
+    return profile['baseline_data'][:, :baseline_length(profile)]
+
+def mean_std(values):
+    """Mean and population std of a series from one sum and one sum of squares"""
+    a = np.asarray(values, dtype=np.float64)
+    mean = a.sum() / len(a)
+    variance = max(np.dot(a, a) / len(a) - mean * mean, 0.0)  # Rounding can dip below 0
+    return float(mean), math.sqrt(variance)
+
+def get_baseline_stats(profile):
+    """Get baseline summary stats, recomputing them only after new samples arrive"""
+    if profile['stats_cache'] is None:
+        stats = {}
+        for signal, values in zip(SIGNALS, baseline_window(profile)):
+            mean, std = mean_std(values) if len(values) else (0, 0)
+            stats[signal] = {'mean': mean, 'std': std, 'count': len(values)}
+        profile['stats_cache'] = stats
+    return profile['stats_cache']
+
+def pool_baselines():
+    """Every user's baseline samples side by side, one row per signal"""
+    windows = [baseline_window(profile) for profile in iter_profiles()]
+    if not windows:
+        return np.empty((len(SIGNALS), 0), dtype=np.float32)
+    # Baselines are stored in float64 for exact stats; the forests fit in float32.
+    # read_metric only lets finite values within MAX_METRIC_VALUE into a
+    # baseline, and float32 holds those, so nothing needs filtering here
+    pooled_data = np.concatenate(windows, axis=1).astype(np.float32)
+    
+    # Each tree only draws 64 samples, so a random subset fits the forests as
+    # well as the whole population and keeps the shared pool a fixed size
+    if pooled_data.shape[1] > GLOBAL_POOL_SIZE:
+        keep = np.random.default_rng().choice(pooled_data.shape[1], GLOBAL_POOL_SIZE, replace=False)
+        pooled_data = pooled_data[:, keep]
+    return pooled_data
+
+def refit_global_detector(pooled_data):
+    """Refit the population detector on pooled baseline samples"""
+    return global_detector.train(dict(zip(SIGNALS, pooled_data)))
+
+def publish_pooled_baselines(pooled_data):
+    """Share pooled baseline samples with every worker through Redis"""
+    pipe = redis_client.pipeline()  # MULTI, so the pool and its version change together
+    pipe.set(GLOBAL_POOL_KEY, pooled_data.tobytes())
+    pipe.incr(GLOBAL_DETECTOR_VERSION_KEY)
+    pipe.execute()
+
+def load_global_detector():
+    """Refit on the shared pool from Redis if it is newer than this process's fit"""
+    version, raw = redis_client.mget(GLOBAL_DETECTOR_VERSION_KEY, GLOBAL_POOL_KEY)
+    if version is None or raw is None or int(version) == global_detector.version:
+        return
+    # Only plain float32 samples cross Redis, never code, and fixed random
+    # state gives every worker the same forests from the same pool
+    refit_global_detector(np.frombuffer(raw, dtype=np.float32).reshape(len(SIGNALS), -1))
+    global_detector.version = int(version)
+
+def sync_global_detector():
+    """Pool baselines when due, then refit on the latest pool"""
+    if redis_client is None:
+        refit_global_detector(pool_baselines())
+        return
+    # The lock lives for one refit interval, so a single worker scans the
+    # profiles per interval and the rest reuse its pool
+    if redis_client.set(GLOBAL_REFIT_LOCK_KEY, os.getpid(), nx=True, ex=GLOBAL_REFIT_INTERVAL):
+        publish_pooled_baselines(pool_baselines())
+    load_global_detector()
+
+def run_global_refits():
+    """Keep the population detector up to date, off the request path"""
+    while True:
+        try:
+            sync_global_detector()
+        except Exception:
+            app.logger.exception('Global detector refit failed')
+        time.sleep(GLOBAL_REFIT_INTERVAL if redis_client is None else GLOBAL_SYNC_INTERVAL)
+
+def start_global_refits():
+    """Start the background refit thread, once per serving process"""
+    threading.Thread(target=run_global_refits, daemon=True).start()
+
+def read_metric(behavior_data, key, default):
+    """A behavior metric as a float, or None if it is not a finite number in range"""
+    value = behavior_data.get(key, default)
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return None
+    try:
+        value = float(value)
+    except OverflowError:
+        return None
+    return value if math.isfinite(value) and abs(value) <= MAX_METRIC_VALUE else None
+
 def get_or_create_profile(user_id):
     """Get existing profile or create new one"""
-    if user_id not in user_profiles:
+    profile = load_profile(user_id)
+    if profile is None:
         return create_user_profile(user_id)
-    return user_profiles[user_id]
+    return profile
 
 @app.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
-    return jsonify({
+    return json_response({
         'status': 'healthy',
         'service': 'SafeStride ML Service',
-        'timestamp': datetime.now().isoformat(),
-        'active_users': len(user_profiles)
+        'timestamp': g.now_iso,
+        'active_users': count_profiles()
     })
 
 @app.route('/analyze', methods=['POST'])
@@ -101,56 +427,49 @@ def analyze_behavior():
         behavior_data = data.get('behavior_data', {})
         
         if not user_id:
-            return jsonify({'error': 'user_id is required'}), 400
+            return json_response({'error': 'user_id is required'}, 400)
+        if not isinstance(behavior_data, dict):
+            return json_response({'error': 'behavior_data must be an object'}, 400)
             
-        # Get or create user profile
-        profile = get_or_create_profile(user_id)
-        
-        # Extract behavior metrics
-        typing_interval = behavior_data.get('avgTypingInterval', 250)
-        mouse_movements = behavior_data.get('mouseMovementCount', 0)
-        scroll_events = behavior_data.get('scrollEventCount', 0)
-        
-        # Update baseline data
-        profile['baseline_data']['typing_intervals'].append(typing_interval)
-        profile['baseline_data']['mouse_movements'].append(mouse_movements)
-        profile['baseline_data']['scroll_events'].append(scroll_events)
+        # Extract behavior metrics, rejecting values (null, NaN, Infinity) that
+        # would poison the stored baseline for good
+        metrics = []
+        for key, default in BEHAVIOR_METRICS:
+            value = read_metric(behavior_data, key, default)
+            if value is None:
+                return json_response({'error': f'behavior_data.{key} must be a finite number of at most 1e9 in magnitude'}, 400)
+            metrics.append(value)
+        sample = np.array(metrics, dtype=np.float64)
         
-        # Keep only last 100 samples
-        profile['baseline_data']['typing_intervals'] = profile['baseline_data']['typing_intervals'][-100:]
-        profile['baseline_data']['mouse_movements'] = profile['baseline_data']['mouse_movements'][-100:]
-        profile['baseline_data']['scroll_events'] = profile['baseline_data']['scroll_events'][-100:]
-        
-        # Train models if we have enough data
-        if len(profile['baseline_data']['typing_intervals']) >= 10:
-            profile['typing_detector'].train(profile['baseline_data']['typing_intervals'])
+        # Read, score and write back the profile without interleaving other
+        # requests for the same user
+        with profile_lock(user_id):
+            # Get or create user profile
+            profile = get_or_create_profile(user_id)
             
-        if len(profile['baseline_data']['mouse_movements']) >= 10:
-            profile['mouse_detector'].train(profile['baseline_data']['mouse_movements'])
+            # Update baseline data, overwriting the oldest sample once the buffer is full
+            profile['baseline_data'][:, profile['baseline_count'] % BASELINE_SIZE] = sample
+            profile['baseline_count'] += 1
+            profile['stats_cache'] = None
             
-        if len(profile['baseline_data']['scroll_events']) >= 10:
-            profile['scroll_detector'].train(profile['baseline_data']['scroll_events'])
-        
-        # Get anomaly scores
-        typing_score = profile['typing_detector'].predict([typing_interval])
-        mouse_score = profile['mouse_detector'].predict([mouse_movements])
-        scroll_score = profile['scroll_detector'].predict([scroll_events])
-        
-        # Calculate weighted overall score
-        overall_score = (typing_score * 0.4 + mouse_score * 0.3 + scroll_score * 0.3)
-        
-        # Determine recommendation
-        if overall_score < 30:
-            recommendation = 'pass'
-        elif overall_score < 70:
-            recommendation = 'reauthenticate'
-        else:
-            recommendation = 'lock'
-        
-        # Update profile timestamp
-        profile['last_updated'] = datetime.now().isoformat()
-        
-        return jsonify({
+            # Score against the baseline before folding the new sample into it.
+            # New users are compared against the whole population instead
+            cold_start = profile['detector_stats'][0, 0] < MIN_BASELINE_SAMPLES
+            typing_score, mouse_score, scroll_score = score_request(sample, profile['detector_stats']).tolist()
+            if cold_start and global_detector.is_trained:
+                typing_score, mouse_score, scroll_score = global_detector.predict(sample)
+            
+            # Calculate weighted overall score
+            overall_score = (typing_score * 0.4 + mouse_score * 0.3 + scroll_score * 0.3)
+            
+            # Determine recommendation
+            recommendation = RECOMMENDATIONS[bisect.bisect_right(RECOMMENDATION_THRESHOLDS, overall_score)]
+            
+            # Update profile timestamp
+            profile['last_updated'] = g.now_iso
+            save_profile(profile)
+            
+        return json_response({
             'success': True,
             'analysis': {
                 'overall_score': round(overall_score, 2),
@@ -158,83 +477,74 @@ def analyze_behavior():
                 'mouse_score': round(mouse_score, 2),
                 'scroll_score': round(scroll_score, 2),
                 'recommendation': recommendation,
-                'confidence': 0.85 if len(profile['baseline_data']['typing_intervals']) >= 20 else 0.6,
+                'confidence': 0.85 if baseline_length(profile) >= 20 else 0.6,
                 'factors': [
-                    f"Typing anomaly: {round(typing_score, 1)}%" if typing_score > 30 else None,
-                    f"Mouse activity anomaly: {round(mouse_score, 1)}%" if mouse_score > 30 else None,
-                    f"Scroll pattern anomaly: {round(scroll_score, 1)}%" if scroll_score > 30 else None
+                    f"{label} anomaly: {round(score, 1)}%"
+                    for label, score in zip(SIGNAL_LABELS, (typing_score, mouse_score, scroll_score))
+                    if score > 30
                 ]
             },
             'profile': {
                 'user_id': profile['user_id'],
-                'data_points': len(profile['baseline_data']['typing_intervals']),
+                'data_points': baseline_length(profile),
                 'last_updated': profile['last_updated']
             }
         })
         
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return json_response({'error': str(e)}, 500)
 
 @app.route('/profile/<user_id>', methods=['GET'])
 def get_profile(user_id):
     """Get user behavior profile"""
-    if user_id not in user_profiles:
-        return jsonify({'error': 'User profile not found'}), 404
-        
-    profile = user_profiles[user_id]
-    
-    return jsonify({
-        'success': True,
-        'profile': {
-            'user_id': profile['user_id'],
-            'created_at': profile['created_at'],
-            'last_updated': profile['last_updated'],
-            'data_points': len(profile['baseline_data']['typing_intervals']),
-            'baseline_stats': {
-                'typing_intervals': {
-                    'mean': np.mean(profile['baseline_data']['typing_intervals']) if profile['baseline_data']['typing_intervals'] else 0,
-                    'std': np.std(profile['baseline_data']['typing_intervals']) if profile['baseline_data']['typing_intervals'] else 0,
-                    'count': len(profile['baseline_data']['typing_intervals'])
-                },
-                'mouse_movements': {
-                    'mean': np.mean(profile['baseline_data']['mouse_movements']) if profile['baseline_data']['mouse_movements'] else 0,
-                    'std': np.std(profile['baseline_data']['mouse_movements']) if profile['baseline_data']['mouse_movements'] else 0,
-                    'count': len(profile['baseline_data']['mouse_movements'])
-                },
-                'scroll_events': {
-                    'mean': np.mean(profile['baseline_data']['scroll_events']) if profile['baseline_data']['scroll_events'] else 0,
-                    'std': np.std(profile['baseline_data']['scroll_events']) if profile['baseline_data']['scroll_events'] else 0,
-                    'count': len(profile['baseline_data']['scroll_events'])
-                }
+    # Hold the profile lock so a concurrent /analyze cannot change the samples
+    # between computing the cached stats and storing them
+    with profile_lock(user_id):
+        profile = load_profile(user_id)
+        if profile is None:
+            return json_response({'error': 'User profile not found'}, 404)
+
+        # Profiles only change on /analyze, which always bumps last_updated
+        return conditional_response(profile['last_updated'], lambda: {
+            'success': True,
+            'profile': {
+                'user_id': profile['user_id'],
+                'created_at': profile['created_at'],
+                'last_updated': profile['last_updated'],
+                'data_points': baseline_length(profile),
+                'baseline_stats': get_baseline_stats(profile)
             }
-        }
-    })
+        })
 
 @app.route('/profile/<user_id>', methods=['DELETE'])
 def delete_profile(user_id):
     """Delete user behavior profile"""
-    if user_id in user_profiles:
-        del user_profiles[user_id]
-        return jsonify({'success': True, 'message': 'Profile deleted'})
+    with profile_lock(user_id):
+        removed = remove_profile(user_id)
+    if removed:
+        return json_response({'success': True, 'message': 'Profile deleted'})
     else:
-        return jsonify({'error': 'User profile not found'}), 404
+        return json_response({'error': 'User profile not found'}, 404)
 
 @app.route('/users', methods=['GET'])
 def list_users():
     """List all user profiles"""
-    return jsonify({
+    # Check the store version first so a 304 never fetches a profile
+    return conditional_response(get_profiles_version(), lambda: {
         'success': True,
         'users': [
             {
                 'user_id': profile['user_id'],
                 'created_at': profile['created_at'],
                 'last_updated': profile['last_updated'],
-                'data_points': len(profile['baseline_data']['typing_intervals'])
+                'data_points': baseline_length(profile)
             }
-            for profile in user_profiles.values()
+            for profile in iter_profiles()
         ]
     })
 
 if __name__ == '__main__':
+    # Development server only; production runs under gunicorn (see gunicorn.conf.py)
     port = int(os.environ.get('PORT', 5001))
-    app.run(host='0.0.0.0', port=port, debug=True) 
\ No newline at end of file
+    start_global_refits()
+    app.run(host='0.0.0.0', port=port, debug=os.environ.get('FLASK_DEBUG') == '1') 
\ No newline at end of file
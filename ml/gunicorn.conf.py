@@ -0,0 +1,25 @@
+import multiprocessing
+import os
+
+# Production server settings, picked up by `gunicorn app:app` run from ml/
+bind = f"0.0.0.0:{os.environ.get('PORT', 5001)}"
+
+# Without Redis, user profiles live in process memory, so a single worker
+# keeps them consistent and request concurrency comes from its threads.
+# WEB_CONCURRENCY is often set by the platform, so it only applies with Redis
+if os.environ.get('REDIS_URL'):
+    workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+else:
+    workers = 1
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 2 * multiprocessing.cpu_count()))
+
+def on_starting(server):
+    if not os.environ.get('REDIS_URL') and int(os.environ.get('WEB_CONCURRENCY', 1)) > 1:
+        server.log.warning('REDIS_URL is not set, so ignoring WEB_CONCURRENCY and running one worker')
+
+def post_worker_init(worker):
+    # Each worker keeps its population detector in sync in the background;
+    # with Redis one of them pools the baselines per interval and each fits on that pool
+    from app import start_global_refits
+    start_global_refits()
@@ -0,0 +1,91 @@
+import math
+
+import numpy as np
+import pytest
+
+import app
+
+
+def test_score_request_matches_python_welford():
+    rng = np.random.default_rng(0)
+    samples = rng.normal([250, 10, 3], [20, 2, 1], size=(30, len(app.SIGNALS)))
+    detector_stats = np.zeros((len(app.SIGNALS), 3))
+    n, mean, M2 = 0, [0.0] * len(app.SIGNALS), [0.0] * len(app.SIGNALS)
+
+    for sample in samples:
+        expected = []
+        for i, x in enumerate(sample):
+            if n < app.MIN_BASELINE_SAMPLES:
+                expected.append(0.5)
+            else:
+                std = math.sqrt(M2[i] / (n - 1) + 1e-8)
+                expected.append(min(100.0, 50 * abs((x - mean[i]) / std)))
+
+        n += 1
+        for i, x in enumerate(sample):
+            delta = x - mean[i]
+            mean[i] += delta / n
+            M2[i] += delta * (x - mean[i])
+
+        np.testing.assert_allclose(app.score_request(sample, detector_stats), expected)
+        np.testing.assert_allclose(detector_stats, np.column_stack([[n] * len(mean), mean, M2]))
+
+    np.testing.assert_allclose(detector_stats[:, 1], samples.mean(axis=0))
+    np.testing.assert_allclose(detector_stats[:, 2] / (n - 1), samples.var(axis=0, ddof=1))
+
+
+@pytest.mark.parametrize('behavior_data', [
+    '{"avgTypingInterval": null}',
+    '{"mouseMovementCount": NaN}',
+    '{"scrollEventCount": Infinity}',
+    '{"avgTypingInterval": 1e300}',
+])
+def test_analyze_rejects_invalid_metrics(behavior_data):
+    client = app.app.test_client()
+    response = client.post(
+        '/analyze',
+        data=f'{{"user_id": "non-finite", "behavior_data": {behavior_data}}}',
+        content_type='application/json'
+    )
+
+    assert response.status_code == 400
+    assert client.get('/profile/non-finite').status_code == 404
+
+
+def test_population_detector_passes_in_distribution_newcomers(monkeypatch):
+    rng = np.random.default_rng(0)
+
+    def draw_users(count, samples_per_user):
+        users = []
+        for _ in range(count):
+            typing, mouse, scroll = rng.normal(250, 40), rng.gamma(4, 12), rng.gamma(2, 4)
+            users.append(np.column_stack([
+                rng.normal(typing, 20, samples_per_user),
+                rng.poisson(mouse, samples_per_user),
+                rng.poisson(scroll, samples_per_user)
+            ]))
+        return users
+
+    monkeypatch.setattr(app.global_detector, 'fitted', None)
+    pooled_data = np.concatenate(draw_users(50, 20)).T.astype(np.float32)
+    assert app.refit_global_detector(pooled_data)
+
+    client = app.app.test_client()
+    recommendations = []
+    for i, user in enumerate(draw_users(200, 1)):
+        typing, mouse, scroll = user[0].tolist()
+        response = client.post('/analyze', json={
+            'user_id': f'newcomer-{i}',
+            'behavior_data': {'avgTypingInterval': typing, 'mouseMovementCount': mouse, 'scrollEventCount': scroll}
+        })
+        recommendations.append(response.get_json()['analysis']['recommendation'])
+        client.delete(f'/profile/newcomer-{i}')
+
+    assert recommendations.count('pass') >= 0.9 * len(recommendations)
+
+    response = client.post('/analyze', json={
+        'user_id': 'outlier',
+        'behavior_data': {'avgTypingInterval': 900, 'mouseMovementCount': 80, 'scrollEventCount': 30}
+    })
+    client.delete('/profile/outlier')
+    assert response.get_json()['analysis']['recommendation'] != 'pass'